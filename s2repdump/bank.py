@@ -3,8 +3,8 @@ import sys
 import logging
 import xml.etree.ElementTree as ET
 import hashlib
+from operator import attrgetter
 from typing import Optional
-from xml.dom import minidom
 from s2repdump.types import GameBankMeta, EBankDataKind, MapInfo
 
 
@@ -21,11 +21,37 @@ data_kind_map = {
     EBankDataKind.COMPLEX: None,
 }
 
+# tag & attribute names of values come from a small fixed set
+encoded_names = {x: x.encode('utf8') for x in ['Value', *data_kind_map.values()] if x is not None}
+
+XML_DECLARATION = '<?xml version="1.0" encoding="utf-8"?>'
+
+
+def escape_attr(value: str):
+    # attribute values are always double quoted
+    # and whitespace is kept as char refs, so it won't be normalized when parsed
+    return (
+        value.replace('&', '&amp;').replace('<', '&lt;').replace('>', '&gt;').replace('"', '&quot;')
+        .replace('\n', '&#10;').replace('\r', '&#13;').replace('\t', '&#9;')
+    )
+
+
+def iter_sc2bank_xml(el, level: int = 0):
+    # SC2 formatting: 4 spaces per level and CRLF line endings
+    pad = ' ' * 4 * level
+    attrs = ''.join(' %s="%s"' % (k, escape_attr(v)) for k, v in el.attrib.items())
+    if len(el):
+        yield '%s<%s%s>\r\n' % (pad, el.tag, attrs)
+        for child in el:
+            yield from iter_sc2bank_xml(child, level + 1)
+        yield '%s</%s>\r\n' % (pad, el.tag)
+    else:
+        yield '%s<%s%s/>\r\n' % (pad, el.tag, attrs)
+
 
 class GameBankStorage:
     def __init__(self, name: str = ''):
-        self.root = ET.Element('Bank')
-        self.root.set('version', '1')
+        self.root = ET.Element('Bank', {'version': '1'})
         self.name = name
 
     def from_file(self, filename):
@@ -36,64 +62,68 @@ class GameBankStorage:
     def rebuild_from_meta(self, gbmeta: GameBankMeta):
         self.name = gbmeta.name
 
-        def enter_section(name):
-            sc_curr = ET.Element('Section')
-            sc_curr.set('name', name)
-            return sc_curr
+        sc_curr = None # type: ET.Element
+        key_curr = None # type: ET.Element
 
-        def enter_key(sc_curr, name: str, data_kind: int, value: bytes):
-            key_curr = ET.Element('Key')
-            key_curr.set('name', name)
-            sc_curr.append(key_curr)
-            if data_kind != EBankDataKind.COMPLEX:
-                enter_value(key_curr, 'Value', data_kind, value)
-            return key_curr
+        # section & key names as well as short values tend to repeat across the bank
+        decoded = {}
 
-        def enter_value(key_curr, name: str, data_kind: int, value: bytes):
-            el = ET.Element(name)
-            el.set(data_kind_map[data_kind], value.decode('utf8'))
-            key_curr.append(el)
+        def decode(value: bytes):
+            s = decoded.get(value)
+            if s is None:
+                s = decoded[value] = value.decode('utf8')
+            return s
 
-        def enter_signature(signature):
-            el = ET.Element('Signature', {'value': ''.join('{:02X}'.format(x) for x in signature)})
-            return el
+        def enter_section(name, kind, data):
+            nonlocal sc_curr
+            sc_curr = ET.SubElement(self.root, 'Section', {'name': decode(name)})
 
-        sc_curr = None # type: ET.Element
-        key_curr = None # type: ET.Element
+        def enter_key(name, kind, data):
+            nonlocal key_curr
+            key_curr = ET.SubElement(sc_curr, 'Key', {'name': decode(name)})
+            if kind != EBankDataKind.COMPLEX:
+                ET.SubElement(key_curr, 'Value', {data_kind_map[kind]: decode(data)})
+
+        def enter_value(name, kind, data):
+            ET.SubElement(key_curr, decode(name), {data_kind_map[kind]: decode(data)})
+
+        def enter_signature(name, kind, data):
+            if len(data) > 0:
+                ET.SubElement(self.root, 'Signature', {'value': data.hex().upper()})
+
+        handlers = {
+            'NNet.Game.SBankSectionEvent': enter_section,
+            'NNet.Game.SBankKeyEvent': enter_key,
+            'NNet.Game.SBankValueEvent': enter_value,
+            'NNet.Game.SBankSignatureEvent': enter_signature,
+        }
 
         # process events
-        for ev in gbmeta.events:
-            if ev['_event'] == 'NNet.Game.SBankSectionEvent':
-                sc_curr = enter_section(ev['m_name'].decode('utf8'))
-                self.root.append(sc_curr)
-            elif ev['_event'] == 'NNet.Game.SBankKeyEvent':
-                key_curr = enter_key(sc_curr, ev['m_name'].decode('utf8'), ev['m_type'], ev['m_data'])
-            elif ev['_event'] == 'NNet.Game.SBankValueEvent':
-                enter_value(key_curr, ev['m_name'].decode('utf8'), ev['m_type'], ev['m_data'])
-            elif ev['_event'] == 'NNet.Game.SBankSignatureEvent':
-                if len(ev['m_signature']) > 0:
-                    sig_el = enter_signature(ev['m_signature'])
-                    self.root.append(sig_el)
-                    # ev['m_toonHandle'].decode()
+        for event, name, kind, data in gbmeta.events:
+            handler = handlers.get(event)
+            if handler is not None:
+                handler(name, kind, data)
 
     def compute_signature(self, author_handle: str = None, self_handle: str = None):
-        pitems = []
-        pitems.append(author_handle or '')
-        pitems.append(self_handle or '')
-        pitems.append(self.name)
-        for section in sorted(list(self.root.findall('Section')), key=lambda x: x.attrib['name']):
-            pitems.append(section.attrib['name'])
-            for key in sorted(list(section.findall('Key')), key=lambda x: x.attrib['name']):
-                pitems.append(key.attrib['name'])
-                for value in sorted(list(key.findall('*')), key=lambda x: x.tag):
-                    pitems.append(value.tag)
+        h = hashlib.sha1()
+        update = h.update
+        update((author_handle or '').encode('utf8'))
+        update((self_handle or '').encode('utf8'))
+        update(self.name.encode('utf8'))
+        text_attr = data_kind_map[EBankDataKind.TEXT]
+        # the tree is kept in the order of events (or as read from file), the signature requires it sorted
+        for section in sorted(self.root.iterfind('Section'), key=lambda x: x.attrib['name']):
+            update(section.attrib['name'].encode('utf8'))
+            for key in sorted(section.iterfind('Key'), key=lambda x: x.attrib['name']):
+                update(key.attrib['name'].encode('utf8'))
+                for value in sorted(key.iterfind('*'), key=attrgetter('tag')):
+                    update(encoded_names.get(value.tag) or value.tag.encode('utf8'))
                     for k, v in value.attrib.items():
-                        pitems.append(k)
+                        update(encoded_names.get(k) or k.encode('utf8'))
                         # text value might be client defined, so it has to be skipped
-                        if k != data_kind_map[EBankDataKind.TEXT]:
-                            pitems.append(v)
-        payload = ''.join(pitems).encode('utf8')
-        return hashlib.sha1(payload).hexdigest().upper()
+                        if k != text_attr:
+                            update(v.encode('utf8'))
+        return h.hexdigest().upper()
 
     def signature(self):
         sig_el = self.root.find('Signature')
@@ -105,12 +135,19 @@ class GameBankStorage:
     def filename(self, author_handle: Optional[str] = None, self_handle: Optional[str] = None):
         return os.path.join(self_handle or '', author_handle or '', '%s.SC2Bank' % self.name)
 
+    def iter_xml(self, prettify: bool = False, declaration: bool = True):
+        if declaration:
+            yield XML_DECLARATION + ('\r\n' if prettify else '')
+        if not prettify:
+            yield ET.tostring(self.root, encoding='unicode')
+            return
+        yield from iter_sc2bank_xml(self.root)
+
     def tostring(self, prettify: bool = False):
-        outxml = ET.tostring(self.root)
-        if prettify:
-            # beautify the content by rewriting it through minidom, so it matches SC2 formatting
-            outxml = minidom.parseString(outxml).toprettyxml(encoding='utf-8', indent=" " * 4, newl="\r\n")
-        return outxml
+        if not prettify:
+            # compact content is the bare element, with non-ASCII chars as char refs - as ET.tostring() gives it
+            return ''.join(self.iter_xml(declaration=False)).encode('ascii', 'xmlcharrefreplace')
+        return ''.join(self.iter_xml(prettify)).encode('utf8')
 
     def write_sc2bank(self, target_dir: Optional[str], prettify: bool = False, author_handle: str = None, self_handle: str = None):
         filename = self.filename(author_handle, self_handle)
@@ -121,13 +158,9 @@ class GameBankStorage:
         )
 
         os.makedirs(os.path.dirname(target_filename), exist_ok=True)
-        if prettify:
-            outxml = self.tostring(prettify)
-            with open(target_filename, 'wb') as f:
-                f.write(outxml)
-        else:
-            btree = ET.ElementTree(self.root)
-            btree.write(target_filename, encoding='utf-8', xml_declaration=True)
+        with open(target_filename, 'w', encoding='utf-8', newline='', buffering=1 << 16) as f:
+            # streamed into the file as it's being serialized
+            f.writelines(self.iter_xml(prettify))
 
         return target_filename
 
@@ -4,17 +4,16 @@ import sys
 import os
 import re
 import json
-from binascii import b2a_hex
-from typing import List
+import hashlib
+import pickle
+from bisect import bisect_left
+from functools import lru_cache, partial
+from itertools import chain
+from typing import List, Optional
 import argparse
 import logging
-from more_itertools import peekable
-from tabulate import tabulate
-from colorlog import ColoredFormatter
-import mpyq
-from s2protocol import versions
 from s2repdump.meta import S2REPDUMP_VERSION
-from s2repdump.utils import resource
+from s2repdump.utils import resource, to_table
 from s2repdump.types import *
 from s2repdump.bank import GameBankStorage
 
@@ -24,12 +23,44 @@ PROTO_VERSION_MAPPINGS = {
     80188: 79998,
 }
 
+PROTO_FILENAME_RE = re.compile(r'^protocol([0-9]+)\.py$')
+
+CACHE_MAX_ENTRIES = 64
+# bumped whenever the layout of cached objects changes
+CACHE_FORMAT = 4
+CACHE_FILENAME_RE = re.compile(r'^[0-9a-f]{64}\.pickle$')
+
+
+# protocol modules can't change during runtime, so these are resolved once per process
+@lru_cache(maxsize=None)
+def get_protocol(build: Optional[int] = None):
+    from s2protocol import versions
+    return versions.build(build) if build is not None else versions.latest()
+
+
+@lru_cache(maxsize=None)
+def get_protocol_builds() -> List[int]:
+    from s2protocol import versions
+    return sorted(int(m.group(1)) for m in map(PROTO_FILENAME_RE.match, versions.list_all()) if m)
+
+
+@lru_cache(maxsize=None)
+def get_cache_key() -> tuple:
+    # cached data is only as good as the decoders which produced it, and the protocol picked for it
+    try:
+        from importlib.metadata import version
+        s2protocol_version = version('s2protocol')
+    except ImportError:
+        import s2protocol
+        s2protocol_version = str(getattr(s2protocol, '__version__', None))
+    return (S2REPDUMP_VERSION, CACHE_FORMAT, s2protocol_version, get_protocol_builds()[-1])
+
 
 @resource
 class S2Replay:
     proto_build: int
     protocol: __module__
-    features: ProtoFeatures = ProtoFeatures()
+    features: ProtoFeatures
 
     header: dict
     details: dict
@@ -39,28 +70,32 @@ class S2Replay:
     participants: GameParticipantsList
     banks: List[GameBankMeta]
 
-    def __init__(self, filename, strict=False):
-        def read_archive_contents(name):
-            content = self.archive.read_file(name)
-            if not content:
-                logging.warning('MPQ missing file: "%s"' % name)
-            return content
+    def __init__(self, filename, strict=False, cache_dir: Optional[str] = None):
+        from more_itertools import peekable
 
-        def must_read_archive_contents(name):
-            content = read_archive_contents(name)
-            if not content:
-                logging.critical('MPQ missing required file: "%s"' % name)
-                sys.exit(1)
-            return content
+        cache_filename = None
+        state = None
+        if cache_dir is not None:
+            cache_filename = os.path.join(cache_dir, '%s.pickle' % file_digest(filename))
+            state = self.load_cache(cache_filename, strict)
 
-        self.archive = mpyq.MPQArchive(filename)
+        if state is None:
+            import mpyq
 
-        content = self.archive.header['user_data_header']['content']
-        self.header = versions.latest().decode_replay_header(content)
+            # files are looked up by name, the listfile isn't needed
+            self.archive = mpyq.MPQArchive(filename, listfile=False)
+
+            content = self.archive.header['user_data_header']['content']
+            self.header = get_protocol().decode_replay_header(content)
+        else:
+            self.archive = None
+            self.header = state['header']
 
         self.proto_build = self.header['m_version']['m_baseBuild']
         logging.info('Protocol build %d' % (self.proto_build))
 
+        self.features = ProtoFeatures()
+
         # >= 24764 (after HotS came out)
         # in WoL observers weren't seperated from players and working slot concept didn't exist
         self.features.user_id_driven = self.proto_build >= 24764
@@ -75,7 +110,7 @@ class S2Replay:
         self.features.tracker_player_pid = self.proto_build >= 25604
 
         try:
-            self.protocol = versions.build(self.proto_build)
+            self.protocol = get_protocol(self.proto_build)
         except ImportError as e:
             logging.warning('Unsupported protocol: (%s)' % (str(e)))
             if strict:
@@ -85,30 +120,204 @@ class S2Replay:
             try:
                 fallbackBuild = PROTO_VERSION_MAPPINGS[self.proto_build]
             except KeyError:
-                proto_mods = [int(re.sub(r'^protocol([0-9]+)\.py$', '\\1', x)) for x in versions.list_all()]
-                tmp = [abs(i - self.proto_build) for i in proto_mods]
-                idx = tmp.index(min(tmp))
+                proto_mods = get_protocol_builds()
+                # nearest build, the older one wins a tie
+                idx = bisect_left(proto_mods, self.proto_build)
+                if idx > 0 and (idx == len(proto_mods) or self.proto_build - proto_mods[idx - 1] <= proto_mods[idx] - self.proto_build):
+                    idx -= 1
                 # always favorize newer protos in case of up to date replays
                 if self.proto_build > 70000 and len(proto_mods) >= (idx + 2):
                     idx += 1
                 fallbackBuild = proto_mods[idx]
-            self.protocol = versions.build(fallbackBuild)
+            self.protocol = get_protocol(fallbackBuild)
             logging.warning('Attempting to use %s instead' % self.protocol.__name__)
 
-        # read files
-        self.details = self.protocol.decode_replay_details(must_read_archive_contents('replay.details'))
-        self.init_data = self.protocol.decode_replay_initdata(must_read_archive_contents('replay.initData'))
-        self.gameevents = peekable(self.protocol.decode_replay_game_events(must_read_archive_contents('replay.game.events')))
-        content = read_archive_contents('replay.message.events')
-        self.messageevents = peekable(self.protocol.decode_replay_message_events(content) if content else None)
-        content = read_archive_contents('replay.tracker.events')
-        self.features.tracker_present = bool(content)
-        self.trackerevents = peekable(self.protocol.decode_replay_tracker_events(content) if content else None)
+        if state is None:
+            # read files
+            self.details = self.protocol.decode_replay_details(self.must_read_archive_contents('replay.details'))
+            self.init_data = self.protocol.decode_replay_initdata(self.must_read_archive_contents('replay.initData'))
+            content = self.read_archive_contents('replay.message.events')
+            # peekable, so that an empty stream is falsy
+            self.messageevents = peekable(self.protocol.decode_replay_message_events(content) if content else ())
+            content = self.read_archive_contents('replay.tracker.events')
+            self.features.tracker_present = bool(content)
+            self.trackerevents = self.protocol.decode_replay_tracker_events(content) if content else iter(())
+            # game events are by far the largest file, which is only needed for banks - read on first access
+            # other event streams are decoded on demand
+            self._gameevents = None
+        else:
+            self.details = state['details']
+            self.init_data = state['init_data']
+            self.messageevents = peekable(state['messageevents'])
+            self.features.tracker_present = state['tracker_present']
+            self.trackerevents = iter(state['trackerevents'])
+            self._gameevents = iter(state['gameevents'])
 
         # setup
         self.info = setup_info(self)
-        self.participants = setup_participants(self)
-        self.banks = setup_banks(self)
+        self._participants = None
+        self._banks = None
+
+        if cache_filename is not None and state is None:
+            self.save_cache(cache_filename)
+
+    def read_archive_contents(self, name: str):
+        content = self.archive.read_file(name)
+        if not content:
+            logging.warning('MPQ missing file: "%s"' % name)
+        return content
+
+    def must_read_archive_contents(self, name: str):
+        content = self.read_archive_contents(name)
+        if not content:
+            logging.critical('MPQ missing required file: "%s"' % name)
+            sys.exit(1)
+        return content
+
+    @property
+    def gameevents(self):
+        if self._gameevents is None:
+            self._gameevents = self.protocol.decode_replay_game_events(self.must_read_archive_contents('replay.game.events'))
+            # nothing else is read from the archive
+            self.archive = None
+        return self._gameevents
+
+    # only the decoded replay data is cached, objects derived from it are rebuilt by the current code on every run
+    # the cache directory must be trusted - its entries are unpickled
+    def load_cache(self, filename: str, strict: bool = False) -> Optional[dict]:
+        try:
+            with open(filename, 'rb') as f:
+                state = pickle.load(f)
+            if not isinstance(state, dict):
+                raise ValueError('unexpected type %s' % type(state).__name__)
+            if state.get('key') != get_cache_key():
+                return None
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            logging.warning('Failed to load cached replay "%s": %s' % (filename, str(e)))
+            return None
+
+        # replays decoded with a fallback protocol are re-examined, so that strict mode can abort
+        if strict and state['protocol'] != 'protocol%05d' % state['header']['m_version']['m_baseBuild']:
+            return None
+
+        # keep recently used entries from being evicted
+        try:
+            os.utime(filename)
+        except OSError as e:
+            logging.warning('Failed to touch cached replay "%s": %s' % (filename, str(e)))
+        logging.debug('Loaded cached replay "%s"' % filename)
+        return state
+
+    def save_cache(self, filename: str):
+        from more_itertools import peekable
+
+        # decoded up front to be stored, the streams are replaced with equivalent ones
+        # decoding errors aren't raised here, but by the streams once they're read - same as without the cache
+        try:
+            content = self.read_archive_contents('replay.game.events')
+            if not content:
+                logging.warning('Not caching replay "%s": no game events' % filename)
+                return
+            # banks are read from the events preceding the game start, nothing else is needed
+            gameevents, self._gameevents, error = materialize_events(
+                self.protocol.decode_replay_game_events(content),
+                lambda ev: ev['_gameloop'] == 0
+            )
+            self.archive = None
+            trackerevents, self.trackerevents, tracker_error = materialize_events(
+                self.trackerevents,
+                lambda ev: ev['_event'] == 'NNet.Replay.Tracker.SPlayerSetupEvent'
+            )
+            messageevents, messagestream, message_error = materialize_events(self.messageevents)
+            self.messageevents = peekable(messagestream)
+
+            error = error or tracker_error or message_error
+            if error is not None:
+                logging.warning('Not caching replay "%s": %s' % (filename, str(error)))
+                return
+
+            state = {
+                'key': get_cache_key(),
+                'protocol': self.protocol.__name__,
+                'header': self.header,
+                'details': self.details,
+                'init_data': self.init_data,
+                'tracker_present': self.features.tracker_present,
+                'messageevents': messageevents,
+                'trackerevents': trackerevents,
+                'gameevents': gameevents,
+            }
+            data = pickle.dumps(state, protocol=pickle.HIGHEST_PROTOCOL)
+        except Exception as e:
+            logging.warning('Not caching replay "%s": %s' % (filename, str(e)))
+            return
+
+        cache_dir = os.path.dirname(filename)
+        # written under a temporary name first, so that concurrent runs never see a partial file
+        tmp_filename = '%s.%d.tmp' % (filename, os.getpid())
+        try:
+            os.makedirs(cache_dir, exist_ok=True)
+            with open(tmp_filename, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_filename, filename)
+        except OSError as e:
+            logging.warning('Failed to save cached replay "%s": %s' % (filename, str(e)))
+            try:
+                os.remove(tmp_filename)
+            except OSError:
+                pass
+            return
+
+        # evict least recently used entries - only files named by us are considered
+        try:
+            entries = [x.path for x in os.scandir(cache_dir) if CACHE_FILENAME_RE.match(x.name)]
+            if len(entries) > CACHE_MAX_ENTRIES:
+                entries.sort(key=os.path.getmtime)
+                for x in entries[:-CACHE_MAX_ENTRIES]:
+                    os.remove(x)
+        except OSError as e:
+            logging.warning('Failed to evict cached replays: %s' % str(e))
+
+    @property
+    def participants(self) -> GameParticipantsList:
+        if self._participants is None:
+            self._participants = setup_participants(self)
+        return self._participants
+
+    @property
+    def banks(self) -> List[GameBankMeta]:
+        if self._banks is None:
+            self._banks = setup_banks(self)
+        return self._banks
+
+
+def file_digest(filename: str) -> str:
+    h = hashlib.sha256()
+    with open(filename, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def raise_deferred(error: Exception):
+    raise error
+    yield
+
+
+def materialize_events(events, predicate=None):
+    # decodes the leading events for which the predicate holds (all by default)
+    # returns them along with a stream equivalent to the original one, and the decoding error if any
+    decoded = []
+    try:
+        for ev in events:
+            if predicate is not None and not predicate(ev):
+                return decoded, chain(decoded, [ev], events), None
+            decoded.append(ev)
+    except Exception as e:
+        return None, chain(decoded, raise_deferred(e)), e
+    return decoded, iter(decoded), None
 
 
 def setup_info(s2rep: S2Replay):
@@ -125,11 +334,8 @@ def setup_info(s2rep: S2Replay):
     info.elapsed_game_loops = s2rep.header['m_elapsedGameLoops']
 
     info.map_info = MapInfo()
-    info.map_info.cache_handles = [*map(
-        # lambda x: '%s.%s' % (b2a_hex(x[16:]).decode(), x[0:4].decode('ascii')),
-        lambda x: '%s' % (b2a_hex(x[16:]).decode()),
-        s2rep.details['m_cacheHandles']
-    )]
+    # '%s.%s' % (x[16:].hex(), x[0:4].decode('ascii'))
+    info.map_info.cache_handles = [x[16:].hex() for x in s2rep.details['m_cacheHandles']]
     info.map_info.author_handle = s2rep.init_data['m_syncLobbyState']['m_gameDescription']['m_mapAuthorName'].decode() or None
     if info.map_info.author_handle:
         info.region = int(info.map_info.author_handle[0])
@@ -140,6 +346,12 @@ def setup_info(s2rep: S2Replay):
 def setup_participants(s2rep: S2Replay):
     plist = GameParticipantsList(s2rep.features)
 
+    lobby_slots = s2rep.init_data['m_syncLobbyState']['m_lobbyState']['m_slots']
+    slot_indexes = {}
+    if s2rep.features.working_slots:
+        for slot_index, sl_slot in enumerate(lobby_slots):
+            slot_indexes.setdefault(sl_slot['m_workingSetSlotId'], slot_index)
+
     for key, dp_entry in enumerate(s2rep.details['m_playerList']):
         if dp_entry['m_control'] in [EPlayerControl.OPEN]: continue
 
@@ -153,15 +365,15 @@ def setup_participants(s2rep: S2Replay):
                 pinfo.handle = '%d-S2-%d-%d' % (dp_entry['m_toon']['m_region'], dp_entry['m_toon']['m_realm'], dp_entry['m_toon']['m_id'])
             else:
                 pinfo.handle = None
-        pinfo.ctrl = EPlayerControl[dp_entry['m_control']]
+        pinfo.ctrl = EPlayerControl(dp_entry['m_control']).name
 
         if dp_entry['m_name']:
-            tmp = dp_entry['m_name'].decode('utf8').split('<sp/>')
+            tmp = dp_entry['m_name'].split(b'<sp/>')
             if len(tmp) > 1:
-                pinfo.name = tmp[1]
-                pinfo.clan = tmp[0].replace('&lt;', '<').replace('&gt;', '>')
+                pinfo.name = tmp[1].decode('utf8')
+                pinfo.clan = tmp[0].decode('utf8').replace('&lt;', '<').replace('&gt;', '>')
             else:
-                pinfo.name = tmp[0]
+                pinfo.name = tmp[0].decode('utf8')
 
         mcol = dp_entry['m_color']
         pinfo.color = PlayerColor(mcol['m_r'], mcol['m_g'], mcol['m_b'], mcol['m_a'])
@@ -177,15 +389,13 @@ def setup_participants(s2rep: S2Replay):
                 pinfo.uid = plist[-2].uid + 1 if len(plist) > 1 else 0
                 continue
 
-            for slot_index, sl_slot in enumerate(s2rep.init_data['m_syncLobbyState']['m_lobbyState']['m_slots']):
-                if dp_entry['m_workingSetSlotId'] != sl_slot['m_workingSetSlotId']: continue
-
+            slot_index = slot_indexes.get(dp_entry['m_workingSetSlotId'])
+            if slot_index is not None:
                 pinfo.working_slot = slot_index
-                pinfo.uid = sl_slot['m_userId']
-                break
+                pinfo.uid = lobby_slots[slot_index]['m_userId']
         else:
             next_slot = plist[-2].working_slot + 1 if len(plist) > 1 else 0
-            sl_slot = s2rep.init_data['m_syncLobbyState']['m_lobbyState']['m_slots'][next_slot]
+            sl_slot = lobby_slots[next_slot]
             pinfo.working_slot = next_slot
             pinfo.uid = sl_slot['m_userId']
 
@@ -201,10 +411,11 @@ def setup_participants(s2rep: S2Replay):
             assert pinfo.uid is not None
 
     if s2rep.features.tracker_player_pid:
-        while True:
-            ev = s2rep.trackerevents.peek()
-            if ev['_event'] != 'NNet.Replay.Tracker.SPlayerSetupEvent': break
-            ev = next(s2rep.trackerevents)
+        for ev in s2rep.trackerevents:
+            if ev['_event'] != 'NNet.Replay.Tracker.SPlayerSetupEvent':
+                # push it back for whoever reads the tracker events next
+                s2rep.trackerevents = chain([ev], s2rep.trackerevents)
+                break
             if ev['m_slotId'] is None: continue
             p = plist.get_player(slot_id=ev['m_slotId'])
             if p is None:
@@ -215,17 +426,43 @@ def setup_participants(s2rep: S2Replay):
     return plist
 
 
-def setup_banks(s2rep: S2Replay) -> List[GameBankMeta]:
-    BANK_EVENTS = [
-        'NNet.Game.SBankFileEvent',
-        'NNet.Game.SBankSectionEvent',
-        'NNet.Game.SBankKeyEvent',
-        'NNet.Game.SBankValueEvent',
-        'NNet.Game.SBankSignatureEvent',
-    ]
+def append_bank_file(s2rep: S2Replay, player_banks: List[GameBankMeta], puid: int, ev):
+    player = s2rep.participants.get_player(puid)
+    player_banks.append(GameBankMeta(ev['m_name'].decode('ascii'), player))
+    player_banks[-1].append_event(ev)
 
+
+def append_bank_event(s2rep: S2Replay, player_banks: List[GameBankMeta], puid: int, ev):
+    player_banks[-1].append_event(ev)
+
+
+BANK_EVENT_HANDLERS = {
+    'NNet.Game.SBankFileEvent': append_bank_file,
+    'NNet.Game.SBankSectionEvent': append_bank_event,
+    'NNet.Game.SBankKeyEvent': append_bank_event,
+    'NNet.Game.SBankValueEvent': append_bank_event,
+    'NNet.Game.SBankSignatureEvent': append_bank_event,
+}
+
+
+@lru_cache(maxsize=None)
+def get_bank_event_handlers(protocol) -> dict:
+    # event ids differ across protocol versions, hence the mapping is built per protocol
+    return {
+        eventid: BANK_EVENT_HANDLERS[name]
+        for eventid, (typeid, name) in protocol.game_event_types.items()
+        if name in BANK_EVENT_HANDLERS
+    }
+
+
+def setup_banks(s2rep: S2Replay) -> List[GameBankMeta]:
     banks = {}
 
+    if s2rep.features.user_id_driven:
+        puid_outer, puid_key = '_userid', 'm_userId'
+    else:
+        puid_outer, puid_key = '_playerid', 'm_playerId'
+
     for x in s2rep.participants:
         if s2rep.features.user_id_driven:
             if x.uid is None: continue
@@ -234,20 +471,15 @@ def setup_banks(s2rep: S2Replay) -> List[GameBankMeta]:
             if x.pid is None: continue
             banks[x.pid] = []
 
+    handlers = get_bank_event_handlers(s2rep.protocol)
     for ev in s2rep.gameevents:
-        if ev['_event'] in BANK_EVENTS:
-            puid = s2rep.features.puid_from_ev(ev)
-
-            if ev['_event'] == 'NNet.Game.SBankFileEvent':
-                player = s2rep.participants.get_player(puid)
-                banks[puid].append(GameBankMeta(ev['m_name'].decode('ascii'), player))
-
-            banks[puid][-1].append_event(ev)
-        else:
-            if ev['_gameloop'] > 0:
-                break
-            else:
-                continue
+        # banks are preloaded before the game starts - none of the remaining events need decoding
+        if ev['_gameloop'] > 0:
+            break
+        handler = handlers.get(ev['_eventid'])
+        if handler is not None:
+            puid = ev[puid_outer][puid_key]
+            handler(s2rep, banks[puid], puid, ev)
 
     tmpl = []
     for x in banks.values():
@@ -256,8 +488,25 @@ def setup_banks(s2rep: S2Replay) -> List[GameBankMeta]:
     return tmpl
 
 
+def rebuild_bank(gbmeta: GameBankMeta, author_handle: Optional[str], target_dir: Optional[str], prettify: bool):
+    bank_store = GameBankStorage()
+    bank_store.rebuild_from_meta(gbmeta)
+
+    expected_signature = bank_store.signature()
+    computed_signature = bank_store.compute_signature(author_handle, gbmeta.player.handle)
+
+    if target_dir is None:
+        filename = bank_store.filename(author_handle, gbmeta.player.handle)
+        content = bank_store.tostring(prettify)
+    else:
+        filename = bank_store.write_sc2bank(target_dir, prettify, author_handle, gbmeta.player.handle)
+        content = None
+
+    return bank_store.name, expected_signature, computed_signature, filename, content
+
+
 def main(args):
-    s2rep = S2Replay(args.replay_file, strict=args.strict)
+    s2rep = S2Replay(args.replay_file, strict=args.strict, cache_dir=args.cache_dir if args.cache else None)
     sections = {}
 
     if 'info' in args.decode:
@@ -265,15 +514,16 @@ def main(args):
             sections['info'] = s2rep.info
         else:
             data = []
-            def append_prop(val, key_path: str = ''):
-                if hasattr(val, 'props'):
-                    for sub_key in val.props:
-                        append_prop(val[sub_key], f'{key_path}.{sub_key}'.lstrip('.'))
+            # depth first, children are pushed in reverse so they're listed in order
+            stack = [(s2rep.info, '')]
+            while stack:
+                val, key_path = stack.pop()
+                if getattr(val, '_is_resource', False):
+                    stack.extend((val[sub_key], f'{key_path}.{sub_key}'.lstrip('.')) for sub_key in reversed(val.props))
                 elif isinstance(val, list):
                     if len(val) == 0:
-                        append_prop(None, f'{key_path}[]')
-                    for i, x in enumerate(val):
-                        append_prop(x, f'{key_path}[{i}]')
+                        stack.append((None, f'{key_path}[]'))
+                    stack.extend((x, f'{key_path}[{i}]') for i, x in reversed([*enumerate(val)]))
                 else:
                     r = None
                     if isinstance(val, (int, str, bool)):
@@ -281,11 +531,9 @@ def main(args):
                     elif val is not None:
                         r = str(val)
                     data.append([key_path, r])
-                    return r
-            append_prop(s2rep.info)
 
             print("\n## REPLAY INFO\n")
-            print(tabulate(data, tablefmt='github'))
+            print(to_table(data))
             print()
 
     if 'players' in args.decode:
@@ -293,7 +541,7 @@ def main(args):
 
         data = []
         for x in s2rep.participants:
-            data.append([x[key] for key in hdkeys])
+            data.append([*GameParticipant._row_getter(x)])
 
         if args.json:
             sections['players'] = []
@@ -304,7 +552,7 @@ def main(args):
                 sections['players'].append(item)
         else:
             print("\n## PLAYERS\n")
-            print(tabulate(data, headers=hdkeys, tablefmt='github'))
+            print(to_table(data, headers=hdkeys))
             print()
 
 
@@ -322,20 +570,22 @@ def main(args):
             else:
                 raise Exception('couldn\'t determine user')
 
-            secs = ev['_gameloop'] / 16
             msg = ev['m_string'].decode('utf8', 'replace')
+            recipient = EMessageRecipient(ev['m_recipient']).name
 
             if args.json:
                 sections['chat'].append({
                     'gameloop': ev['_gameloop'],
                     'uid': participant.uid,
-                    'recipient': EMessageRecipient[ev['m_recipient']].lower(),
+                    'recipient': recipient.lower(),
                     'message': msg,
                 })
             else:
+                mins, secs = divmod(ev['_gameloop'] // 16, 60)
+                hours, mins = divmod(mins, 60)
                 print('%s | %06s | %-s: %s' % (
-                    '%d:%02d:%02d' % (secs / 3600, secs % 3600 / 60, secs % 60),
-                    EMessageRecipient[ev['m_recipient']],
+                    '%d:%02d:%02d' % (hours, mins, secs),
+                    recipient,
                     participant.name,
                     msg
                 ))
@@ -353,9 +603,10 @@ def main(args):
                 data.append([
                     i,
                     cbank.player.name,
-                ] + [cbank[key] for key in GameBankMeta.props])
+                    *GameBankMeta._row_getter(cbank),
+                ])
             print("\n## BANKS\n")
-            print(tabulate(data, headers=hdkeys, tablefmt='github'))
+            print(to_table(data, headers=hdkeys))
             print()
 
 
@@ -366,21 +617,42 @@ def main(args):
         if not args.json and not args.force and os.path.isdir(args.out) and len(os.listdir(args.out)) > 0:
             logging.error('Specified output directory "%s" already exists and is not empty, aborting..' % (args.out))
         else:
+            author_handle = s2rep.info.map_info.author_handle
+            pnames = []
             for gbmeta in s2rep.banks:
                 pname = '%s' % (gbmeta.player.name)
                 if gbmeta.player.handle:
                     pname += ' [%s]' % (gbmeta.player.handle)
                 logging.info(f'Rebuilding "{gbmeta.name}.SC2Bank" for player {pname} ..')
-                bank_store = GameBankStorage()
-                bank_store.rebuild_from_meta(gbmeta)
+                pnames.append(pname)
+
+            rebuild = partial(
+                rebuild_bank,
+                author_handle=author_handle,
+                target_dir=None if args.json else args.out,
+                prettify=not args.json_compact,
+            )
+            # banks are independent from each other, spread them across the CPUs available to us
+            if hasattr(os, 'sched_getaffinity'):
+                cpus = len(os.sched_getaffinity(0))
+            else:
+                cpus = os.cpu_count() or 1
+            workers = min(len(s2rep.banks), cpus)
+            if workers < 2:
+                results = map(rebuild, s2rep.banks)
+            else:
+                from concurrent.futures import ProcessPoolExecutor
+
+                with ProcessPoolExecutor(max_workers=workers) as executor:
+                    results = [*executor.map(rebuild, s2rep.banks)]
 
-                expected_signature = bank_store.signature()
-                computed_signature = bank_store.compute_signature(s2rep.info.map_info.author_handle, gbmeta.player.handle)
+            for gbmeta, pname, result in zip(s2rep.banks, pnames, results):
+                name, expected_signature, computed_signature, filename, content = result
                 if expected_signature is not None and expected_signature != computed_signature:
                     logging.warning(
                         'Signature missmatch for player: %s bank: %s! expected: %s computed: %s',
                         pname,
-                        bank_store.name,
+                        name,
                         expected_signature,
                         computed_signature
                     )
@@ -388,33 +660,45 @@ def main(args):
                 if args.json:
                     sections['sc2banks'].append({
                         'uid': gbmeta.player.uid,
-                        'name': bank_store.name,
+                        'name': name,
                         'expected_signature': expected_signature,
                         'computed_signature': computed_signature,
-                        'filename': bank_store.filename(s2rep.info.map_info.author_handle, gbmeta.player.handle),
-                        'content': bank_store.tostring(not args.json_compact),
+                        'filename': filename,
+                        'content': content,
                     })
                 else:
-                    filename = bank_store.write_sc2bank(args.out, True, s2rep.info.map_info.author_handle, gbmeta.player.handle)
                     logging.debug(f'File saved at "{filename}"')
 
     if args.json:
+        # converters are resolved once per type, rather than for every object passed to the encoder
+        converters = {bytes: lambda obj: obj.decode('utf8')}
         def dumper(obj):
-            if hasattr(obj, 'toJSON'):
-                return obj.toJSON()
-            if isinstance(obj, bytes):
-                return obj.decode('utf8')
-            else:
-                return obj.__dict__
-        print(json.dumps(
-            sections,
-            default=dumper,
-            indent=None if args.json_compact else '\t',
-            separators=(',', ':') if args.json_compact else (',', ': ')
-        ))
+            conv = converters.get(type(obj))
+            if conv is None:
+                conv = converters[type(obj)] = type(obj).toJSON if hasattr(type(obj), 'toJSON') else vars
+            return conv(obj)
+        try:
+            import orjson
+        except ImportError:
+            orjson = None
+
+        if args.json_compact and orjson is not None:
+            # unlike json.dumps, non-ASCII chars are kept unescaped - write raw UTF-8
+            # so that it doesn't depend on the console encoding
+            sys.stdout.flush()
+            sys.stdout.buffer.write(orjson.dumps(sections, default=dumper) + b'\n')
+        else:
+            print(json.dumps(
+                sections,
+                default=dumper,
+                indent=None if args.json_compact else '\t',
+                separators=(',', ':') if args.json_compact else (',', ': ')
+            ))
 
 
 def setup_logger():
+    from colorlog import ColoredFormatter
+
     logFormatter = ColoredFormatter(
         "%(asctime)s,%(msecs)-3d %(log_color)s%(levelname)-8s%(reset)s %(blue)s%(filename)s:%(lineno)s%(reset)s %(message)s",
         datefmt='%H:%M:%S',
@@ -434,8 +718,17 @@ def setup_logger():
     logging.getLogger().addHandler(consoleHandler)
 
 
+class VersionAction(argparse.Action):
+    def __init__(self, option_strings, dest=argparse.SUPPRESS, default=argparse.SUPPRESS, help=None):
+        super().__init__(option_strings=option_strings, dest=dest, default=default, nargs=0, help=help)
+
+    def __call__(self, parser, namespace, values, option_string=None):
+        # s2protocol is imported only when needed, as loading the protocol modules isn't free
+        print('%s %s (s2protocol %s)' % (parser.prog, S2REPDUMP_VERSION, get_protocol().__name__[8:]))
+        parser.exit()
+
+
 def cli():
-    ver = ('%s (s2protocol %s)' % (S2REPDUMP_VERSION, versions.latest().__name__[8:]))
     parser = argparse.ArgumentParser(
         prog='s2repdump',
         formatter_class=argparse.RawTextHelpFormatter,
@@ -445,12 +738,19 @@ def cli():
     comg = parser.add_argument_group('common')
     comg.add_argument('-v', '--verbose', help='verbose logging; stacks up to 3', action='count', default=0)
     comg.add_argument('-q', '--quiet', action='store_true')
-    comg.add_argument('-V', '--version', action='version', version='%(prog)s ' + ver)
+    comg.add_argument('-V', '--version', action=VersionAction, help='show program\'s version number and exit')
     comg.add_argument('-j', '--json', help='output data as JSON', action='store_true')
     comg.add_argument('-J', '--json-compact', help='output data as compact JSON', action='store_true')
     comg.add_argument('-O', '--out', help='output directory', type=str, default='./out')
     comg.add_argument('-f', '--force', action='store_true', help='force certain operations that otherwise would\'ve been aborted - such overwriting existing files')
     comg.add_argument('--strict', help='do not try to decode replays if there\'s not matching protocol', action='store_true')
+    comg.add_argument('--cache', help='keep decoded replays in a cache directory, to speed up subsequent runs on the same replay', action='store_true')
+    comg.add_argument(
+        '--cache-dir',
+        help='cache directory; implies --cache\nonly use a trusted directory - cached entries are unpickled\n(default: $XDG_CACHE_HOME/s2repdump)',
+        type=str,
+        metavar='DIR',
+    )
 
     comg = parser.add_argument_group('actions')
     comg.add_argument('-d', '--decode', choices=['info', 'players', 'chat', 'banks'], type=str, action='append', default=[], help='decode and output specified data section')
@@ -459,6 +759,10 @@ def cli():
     args = parser.parse_args()
     if args.json_compact:
         args.json = True
+    if args.cache_dir is not None:
+        args.cache = True
+    elif args.cache:
+        args.cache_dir = os.path.join(os.environ.get('XDG_CACHE_HOME') or os.path.expanduser('~/.cache'), 's2repdump')
     args.verbose = min(args.verbose, 3)
 
     setup_logger()
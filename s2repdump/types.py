@@ -1,24 +1,22 @@
+from enum import IntEnum
 from typing import List
-from s2repdump.utils import enum, resource
+from s2repdump.utils import resource
 
 
-@enum
-class EPlayerControl:
+class EPlayerControl(IntEnum):
     OPEN     = 0
     CLOSED   = 1
     HUMAN    = 2
     COMPUTER = 3
 
 
-@enum
-class EObserve:
+class EObserve(IntEnum):
     NONE      = 0
     SPECTATOR = 1
     REFEREE   = 2
 
 
-@enum
-class EGameSpeed:
+class EGameSpeed(IntEnum):
     SLOWER = 0
     SLOW   = 1
     NORMAL = 2
@@ -26,8 +24,7 @@ class EGameSpeed:
     FASTER = 4
 
 
-@enum
-class EMessageRecipient:
+class EMessageRecipient(IntEnum):
     ALL        = 0
     ALLIES     = 1
     INDIVIDUAL = 2
@@ -35,8 +32,7 @@ class EMessageRecipient:
     OBSERVERS  = 4
 
 
-@enum
-class EBankDataKind:
+class EBankDataKind(IntEnum):
     FIXED     = 0
     FLAG      = 1
     INT       = 2
@@ -68,8 +64,7 @@ COLOR_CODES = {
 }
 
 
-@enum
-class EGameRegion:
+class EGameRegion(IntEnum):
     US   = 1
     EU   = 2
     KR   = 3
@@ -97,17 +92,21 @@ class ReplayInfo:
 
 @resource
 class PlayerColor:
+    __slots__ = ('r', 'g', 'b', 'a', '_hex', '_name')
+
     def __init__(self, *components):
         self.r = components[0]
         self.g = components[1]
         self.b = components[2]
         self.a = components[3]
+        self._hex = format(self.r << 16 | self.g << 8 | self.b, '06X')
+        self._name = COLOR_CODES.get(self._hex, f'#{self._hex}')
 
     def hex(self):
-        return f'{self.r:02X}{self.g:02X}{self.b:02X}'
+        return self._hex
 
     def __str__(self):
-        return COLOR_CODES.get(self.hex(), f'#{self.hex()}')
+        return self._name
 
     def toJSON(self):
         return self.hex()
@@ -115,50 +114,85 @@ class PlayerColor:
 
 @resource
 class GameParticipant:
-    idx: int = None
-    pid: int = None
-    uid: int = None
-    name: str = None
-    clan: str = None
-    ctrl: int = None
-    handle: str = None
-    working_slot: int = None
-    color: PlayerColor = None
+    __slots__ = ('idx', 'pid', 'uid', 'name', 'clan', 'ctrl', 'handle', 'working_slot', 'color', '_owner')
+
+    idx: int
+    pid: int
+    uid: int
+    name: str
+    clan: str
+    ctrl: int
+    handle: str
+    working_slot: int
+    color: PlayerColor
+
+    def __init__(self):
+        # the list indexing this participant, if any
+        self._owner = None
+        self.idx = None
+        self.pid = None
+        self.uid = None
+        self.name = None
+        self.clan = None
+        self.ctrl = None
+        self.handle = None
+        self.working_slot = None
+        self.color = None
+
+    def __setattr__(self, name, value):
+        if name in ('uid', 'pid', 'working_slot') and self._owner is not None:
+            self._owner._indexes = None
+        super().__setattr__(name, value)
 
 
 @resource
 class GameBankMeta:
+    __slots__ = ('name', 'uid', 'player', 'events', 'net_bits', 'content_size', 'sections_count', 'keys_count', 'signed')
+
     name: str
     uid: int
-    net_size: int = 0
-    content_size: int = 0
-    sections_count: int = 0
-    keys_count: int = 0
-    signed: bool = False
+    net_size: float
+    content_size: int
+    sections_count: int
+    keys_count: int
+    signed: bool
 
     def __init__(self, name, player: GameParticipant):
         self.name = name
         self.uid = player.uid
         self.player = player
         self.events = []
+        self.net_bits = 0
+        self.content_size = 0
+        self.sections_count = 0
+        self.keys_count = 0
+        self.signed = False
 
-    def append_event(self, ev):
-        self.events.append(ev)
+    @property
+    def net_size(self):
+        return self.net_bits / 8
 
-        if ev['_event'] == 'NNet.Game.SBankSectionEvent':
+    def append_event(self, ev):
+        # only what's needed to rebuild the bank is kept, as (event, name, kind, data)
+        event = ev['_event']
+        if event == 'NNet.Game.SBankSectionEvent':
             self.sections_count += 1
             self.content_size += len(ev['m_name'])
-        elif ev['_event'] == 'NNet.Game.SBankKeyEvent':
+            self.events.append((event, ev['m_name'], None, None))
+        elif event == 'NNet.Game.SBankKeyEvent':
             self.keys_count += 1
-            self.content_size += len(ev['m_name'])
-            self.content_size += len(ev['m_data'])
-        elif ev['_event'] == 'NNet.Game.SBankValueEvent':
-            self.content_size += len(ev['m_name'])
-            self.content_size += len(ev['m_data'])
-        elif ev['_event'] == 'NNet.Game.SBankSignatureEvent' and len(ev['m_signature']) > 0:
-            self.signed = True
-
-        self.net_size += ev['_bits'] / 8
+            self.content_size += len(ev['m_name']) + len(ev['m_data'])
+            self.events.append((event, ev['m_name'], ev['m_type'], ev['m_data']))
+        elif event == 'NNet.Game.SBankValueEvent':
+            self.content_size += len(ev['m_name']) + len(ev['m_data'])
+            self.events.append((event, ev['m_name'], ev['m_type'], ev['m_data']))
+        elif event == 'NNet.Game.SBankSignatureEvent':
+            signature = bytes(ev['m_signature'])
+            if len(signature) > 0:
+                self.signed = True
+            self.events.append((event, None, None, signature))
+
+        self.net_bits += ev['_bits']
 
     def toJSON(self):
         return self.fields
@@ -166,6 +200,8 @@ class GameBankMeta:
 
 @resource
 class ProtoFeatures:
+    __slots__ = ('user_id_driven', 'working_slots', 'tracker_present', 'tracker_player_pid')
+
     user_id_driven: bool
     working_slots: bool
     tracker_present: bool
@@ -180,6 +216,56 @@ class GameParticipantsList(list):
     def __init__(self, features: ProtoFeatures):
         super().__init__(self)
         self.features = features
+        self._indexes = None
+
+    # indexes are rebuilt on the next lookup after participants or their uid, pid or working_slot change
+    def append(self, participant: GameParticipant):
+        participant._owner = self
+        super().append(participant)
+        self._indexes = None
+
+    def extend(self, participants):
+        for x in participants:
+            self.append(x)
+
+    def insert(self, index, participant: GameParticipant):
+        participant._owner = self
+        super().insert(index, participant)
+        self._indexes = None
+
+    def __setitem__(self, index, value):
+        super().__setitem__(index, value)
+        for x in self:
+            x._owner = self
+        self._indexes = None
+
+    def __delitem__(self, index):
+        super().__delitem__(index)
+        self._indexes = None
+
+    def remove(self, participant: GameParticipant):
+        super().remove(participant)
+        self._indexes = None
+
+    def pop(self, index=-1):
+        participant = super().pop(index)
+        self._indexes = None
+        return participant
+
+    def clear(self):
+        super().clear()
+        self._indexes = None
+
+    def _lookup(self, field: str, key):
+        if self._indexes is None:
+            # in case of duplicates the first participant in the list takes precedence
+            self._indexes = {'uid': {}, 'pid': {}, 'working_slot': {}}
+            for x in self:
+                for name, index in self._indexes.items():
+                    value = getattr(x, name)
+                    if value is not None:
+                        index.setdefault(value, x)
+        return self._indexes[field].get(key)
 
     def get_player(self, puid=None, uid=None, pid=None, slot_id=None) -> GameParticipant:
         if puid is not None:
@@ -188,20 +274,23 @@ class GameParticipantsList(list):
             else:
                 pid = puid
 
-        try:
-            if uid is not None:
-                return next(filter(lambda x: x.uid == uid, self))
-            elif pid is not None:
-                return next(filter(lambda x: x.pid == pid, self))
-            elif slot_id is not None:
-                return next(filter(lambda x: x.working_slot == slot_id, self))
-            else:
-                raise Exception()
-        except StopIteration:
-            return None
+        if uid is not None:
+            return self._lookup('uid', uid)
+        elif pid is not None:
+            return self._lookup('pid', pid)
+        elif slot_id is not None:
+            return self._lookup('working_slot', slot_id)
+        else:
+            raise Exception()
 
     def get_player_by_uid(self, uid):
-        return next(filter(lambda x: x.uid == uid, self))
+        participant = self._lookup('uid', uid)
+        if participant is None:
+            raise KeyError(uid)
+        return participant
 
     def get_player_by_pid(self, pid):
-        return next(filter(lambda x: x.pid == pid, self))
+        participant = self._lookup('pid', pid)
+        if participant is None:
+            raise KeyError(pid)
+        return participant
@@ -1,21 +1,7 @@
 import json
+import unicodedata
 from collections import OrderedDict
-
-
-def enum(cls):
-    keys = dict((getattr(cls, i), i) for i in dir(cls) if not i.startswith('__'))
-    values = dict((i, getattr(cls, i)) for i in dir(cls) if not i.startswith('__'))
-
-    def attr(_self, v):
-        return values[v]
-
-    def item(_self, v):
-        return keys[v]
-
-    cls.__getattr__ = attr
-    cls.__getitem__ = item
-    self = cls()
-    return self
+from operator import attrgetter
 
 
 def resource(obj):
@@ -32,8 +18,14 @@ def resource(obj):
     def get_fields(self):
         return OrderedDict([k, self[k]] for k in self.props)
 
+    obj._is_resource = True
     obj.props = get_props()
     obj.fields = get_fields
+    # values of all props at once, attrgetter returns a bare value rather than a tuple for a single name
+    if len(obj.props) == 1:
+        obj._row_getter = staticmethod(lambda x, getter=attrgetter(*obj.props): (getter(x),))
+    elif obj.props:
+        obj._row_getter = staticmethod(attrgetter(*obj.props))
 
     obj.__getitem__ = lambda self, attr: getattr(self, attr) if hasattr(self, attr) else None
     obj.__setitem__ = lambda self, attr, value: setattr(self, attr, value)
@@ -51,3 +43,70 @@ def to_json(data):
         else:
             return str(d)
     return json.dumps(data, indent=4, sort_keys=False, ensure_ascii=False, default=defs)
+
+
+def text_width(text: str) -> int:
+    # terminal columns taken by the text - wide (CJK) chars take two, combining chars none
+    if len(text.encode('utf8')) == len(text):
+        return len(text)
+    return sum(
+        0 if unicodedata.combining(c) else 2 if unicodedata.east_asian_width(c) in ('W', 'F') else 1
+        for c in text
+    )
+
+
+def to_table(rows, headers=None):
+    # github flavored markdown, laid out the same way `tabulate(tablefmt='github')` does
+    ncols = len(headers) if headers else len(rows[0]) if rows else 0
+    columns = []
+    numeric = []
+    for i in range(ncols):
+        values = [row[i] for row in rows]
+        kind = bool
+        for v in values:
+            if isinstance(v, bool) or v is None or v == '':
+                continue
+            elif isinstance(v, int):
+                kind = int if kind is bool else kind
+            elif isinstance(v, float):
+                kind = float if kind in (bool, int) else kind
+            else:
+                kind = str
+        cells = []
+        decimals = []
+        for v in values:
+            if v is None:
+                x = ''
+            elif kind is float and isinstance(v, (int, float)):
+                x = format(v, 'g')
+            else:
+                # surrounding whitespace is stripped, as tabulate does
+                x = str(v).strip()
+            cells.append(x)
+            # digits after the decimal point (or exponent), numeric columns are aligned on it
+            pos = x.rfind('.') if '.' in x else x.rfind('e')
+            decimals.append(len(x) - pos - 1 if isinstance(v, float) and pos >= 0 else -1)
+        if kind in (int, float):
+            cells = [x + ' ' * (max(decimals) - d) for x, d in zip(cells, decimals)]
+        columns.append(cells)
+        numeric.append(kind in (int, float))
+
+    if headers:
+        headers = [str(h).strip() for h in headers]
+    widths = [max(map(text_width, x), default=0) for x in columns]
+    if headers:
+        widths = [max(w, text_width(h) + 2) for w, h in zip(widths, headers)]
+
+    def fmt_row(cells):
+        padded = []
+        for x, w, num in zip(cells, widths, numeric):
+            pad = ' ' * (w - text_width(x))
+            padded.append(pad + x if num else x + pad)
+        return '| %s |' % ' | '.join(padded)
+
+    lines = []
+    if headers:
+        lines.append(fmt_row(headers))
+    lines.append('|%s|' % '|'.join('-' * (w + 2) for w in widths))
+    lines.extend(fmt_row(cells) for cells in zip(*columns))
+    return '\n'.join(lines)
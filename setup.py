@@ -17,8 +17,10 @@ setup(
     python_requires='>=3.6',
     install_requires=[
         's2protocol',
-        'tabulate',
         'colorlog',
         'more-itertools',
     ],
+    extras_require={
+        'orjson': ['orjson'],
+    },
 )